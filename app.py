@@ -1,10 +1,10 @@
+import msgspec
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, Response
 from pydantic import BaseModel, HttpUrl
 
-from reposensei.analyzer.analyze import analyze_repo
+from reposensei.analyzer.analyze import aanalyze_repo
 from reposensei.render import to_architecture_md
-from reposensei.schemas import RepoReport
 
 app = FastAPI(title="RepoSensei 🥋", version="1.0.0")
 
@@ -19,20 +19,22 @@ def health():
     return {"status": "ok"}
 
 
-@app.post("/analyze", response_model=RepoReport)
-def analyze(req: AnalyzeRequest):
+@app.post("/analyze")
+async def analyze(req: AnalyzeRequest):
     try:
-        # keep JSON endpoint simple
-        return analyze_repo(str(req.repo_url), model_override=req.model)
+        # keep JSON endpoint simple; blocking clone/scan work runs in a thread inside aanalyze_repo
+        report = await aanalyze_repo(str(req.repo_url), model_override=req.model)
+        # RepoReport is a msgspec.Struct; encode it directly (same JSON shape as before)
+        return Response(content=msgspec.json.encode(report), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/architecture-md", response_class=PlainTextResponse)
-def architecture_md(req: AnalyzeRequest):
+async def architecture_md(req: AnalyzeRequest):
     try:
         # IMPORTANT: get signals too for evidence-gated markdown + transparency section
-        report, signals = analyze_repo(str(req.repo_url), model_override=req.model, return_signals=True)
+        report, signals = await aanalyze_repo(str(req.repo_url), model_override=req.model, return_signals=True)
         return to_architecture_md(report, signals=signals)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1 +1 @@
-from .analyze import analyze_repo
\ No newline at end of file
+from .analyze import aanalyze_repo, analyze_repo
\ No newline at end of file
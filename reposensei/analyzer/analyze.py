@@ -1,22 +1,59 @@
+import asyncio
 import json
 import os
 import re
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import msgspec
+import orjson
 from dotenv import load_dotenv
 from git import Repo
 
-from reposensei.llm import LLMProvider, OllamaProvider, OpenAIProvider
-from reposensei.schemas import RepoReport
-from reposensei.signals import build_signals
-from reposensei.utils import build_tree, pick_important_files, read_files
+from reposensei.llm import CachedLLM, LLMProvider, OllamaProvider, OpenAIProvider
+from reposensei.schemas import ModuleItem, RepoReport
+from reposensei.signals import _IGNORE_DIRS as _SIGNALS_IGNORE_DIRS, build_signals_cached
+from reposensei.utils import IGNORE_DIRS, build_tree, pick_important_files, read_files
 
 load_dotenv()
 
+# Dirs every scanner skips; leaving them out of the checkout avoids fetching their blobs
+# (derived from both ignore sets so the checkout can't drift from what the scanners skip)
+_SPARSE_EXCLUDE_DIRS = tuple(sorted((_SIGNALS_IGNORE_DIRS & IGNORE_DIRS) - {".git"}))
+
 # Detect /route-like tokens inside step strings
 _ROUTE_LIKE = re.compile(r"(^|\s)(/[^\s]+)")
 
+# Source-file suffixes that mark a step token as a file citation
+_FILE_EXTS = frozenset({".py", ".html", ".md", ".js", ".ts", ".tsx", ".go", ".java", ".kt"})
+
+# Classify a step token in one match:
+# - "path": file paths / source files, never touched
+# - "endpoint": snake_case identifiers that read like endpoint/view names (e.g. create_order_view),
+#   optionally wrapped in quotes/brackets/punctuation
+_TOKEN_CLASSIFY = re.compile(
+    r"(?P<path>\S*[/\\]\S*|\S*\.(?:" + "|".join(sorted(e[1:] for e in _FILE_EXTS)) + r"))"
+    r"|[`'\"(\[]*(?P<endpoint>[a-z][a-z0-9]*(?:_[a-z0-9]+)+)[`'\"()\[\],.;:]*",
+    re.IGNORECASE,
+)
+_ROUTE_SPLIT_RE = re.compile(r"[^A-Za-z0-9_]+")
+
+# Vague web-stack labels the model likes to emit, expanded to concrete entries
+_STACK_ALIASES = {
+    "html/css/js": ("HTML", "CSS", "JavaScript"),
+    "html/css": ("HTML", "CSS", "JavaScript"),
+    "html": ("HTML", "CSS", "JavaScript"),
+}
+
+
+def _classify_token(tok: str, route_tokens: frozenset[str]) -> str:
+    m = _TOKEN_CLASSIFY.fullmatch(tok)
+    endpoint = m.group("endpoint") if m else None
+    if endpoint and len(endpoint) >= 8 and endpoint not in route_tokens:
+        return "not_confirmed_endpoint"
+    return tok
+
 
 def _sanitize_report_dict(data: dict, signals: dict, mode: str) -> dict:
     """
@@ -36,30 +73,21 @@ def _sanitize_report_dict(data: dict, signals: dict, mode: str) -> dict:
     tech_stack = data.get("tech_stack", [])
     if isinstance(tech_stack, list):
         cleaned: list[str] = []
-        for t in tech_stack:
-            if not isinstance(t, str):
-                continue
-            ts = t.strip()
-            low = ts.lower()
-
-            if low in {"html/css/js", "html/css", "html"}:
-                cleaned.extend(["HTML", "CSS", "JavaScript"])
-                continue
-
-            if ts in allowed_stack:
+        for ts in (t.strip() for t in tech_stack if isinstance(t, str)):
+            alias = _STACK_ALIASES.get(ts.lower())
+            if alias:
+                cleaned.extend(alias)
+            elif ts in allowed_stack:
                 cleaned.append(ts)
 
-        seen = set()
-        out: list[str] = []
-        for x in cleaned:
-            if x not in seen:
-                seen.add(x)
-                out.append(x)
-        data["tech_stack"] = out
+        # order-preserving dedupe
+        data["tech_stack"] = list(dict.fromkeys(cleaned))
 
     # --- Route / endpoint sanitization ---
     allowed_routes = set(signals.get("routes_sample", []))
     no_route_evidence = len(allowed_routes) == 0
+    # word-level pieces of every confirmed route, e.g. "/api/user_profile/<id>" -> api, user_profile, id
+    route_tokens = frozenset(part for r in allowed_routes for part in _ROUTE_SPLIT_RE.split(r) if part)
 
     def scrub_step(step: str) -> str:
         def repl_route(m: re.Match) -> str:
@@ -74,28 +102,7 @@ def _sanitize_report_dict(data: dict, signals: dict, mode: str) -> dict:
             return step2
 
         # Scrub endpoint-ish snake_case tokens BUT NEVER inside file paths/templates.
-        parts = step2.split()
-        cleaned_parts: list[str] = []
-
-        for tok in parts:
-            lowtok = tok.lower()
-
-            # Skip paths/files
-            if ("/" in tok) or lowtok.endswith(
-                (".py", ".html", ".md", ".js", ".ts", ".tsx", ".go", ".java", ".kt")
-            ):
-                cleaned_parts.append(tok)
-                continue
-
-            if "_" in tok and len(tok) >= 8:
-                if any(tok in r for r in allowed_routes):
-                    cleaned_parts.append(tok)
-                else:
-                    cleaned_parts.append("not_confirmed_endpoint")
-            else:
-                cleaned_parts.append(tok)
-
-        return " ".join(cleaned_parts)
+        return " ".join([_classify_token(tok, route_tokens) for tok in step2.split()])
 
     flows = data.get("critical_flows", [])
     if isinstance(flows, list):
@@ -128,29 +135,80 @@ def _sanitize_report_dict(data: dict, signals: dict, mode: str) -> dict:
 
             cleaned_imps.append(s)
 
-        seen = set()
-        out_imps: list[str] = []
-        for x in cleaned_imps:
-            if x not in seen:
-                seen.add(x)
-                out_imps.append(x)
-        data["improvements"] = out_imps
+        data["improvements"] = list(dict.fromkeys(cleaned_imps))
 
     return data
 
 
+def _loads(text: str):
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        # stdlib is more lenient (e.g. NaN, lone surrogates) for messy model output
+        return json.loads(text)
+
+
+# Only these characters can change brace depth / string state
+_JSON_SCAN_RE = re.compile(r'[{}"\\]')
+
+
+def _extract_first_json_object(s: str) -> dict:
+    """
+    Single forward scan for the first balanced top-level {...} that parses as JSON.
+    Tracks string/escape state so braces inside strings don't count; prose braces
+    outside an object (e.g. in a mermaid block) just yield a candidate that fails to parse.
+    """
+    depth = 0
+    start = -1
+    in_string = False
+    skip_to = -1
+    for m in _JSON_SCAN_RE.finditer(s):
+        i = m.start()
+        if i < skip_to:
+            continue
+        ch = m.group()
+        if in_string:
+            if ch == "\\":
+                skip_to = i + 2  # escaped char, e.g. \"
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = depth > 0
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                try:
+                    obj = _loads(s[start : i + 1])
+                except ValueError:
+                    continue
+                if isinstance(obj, dict):
+                    return obj
+    raise ValueError("Model did not return JSON.")
+
+
 def _extract_json(text: str) -> dict:
     text = text.strip()
     try:
-        return json.loads(text)
+        obj = _loads(text)
     except Exception:
-        pass
+        obj = None
+    # only an object is a report; [...], "..." or 42 fall through to the scan, which
+    # also recovers a report wrapped in a list
+    if isinstance(obj, dict):
+        return obj
+    return _extract_first_json_object(text)
+
 
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1 or end <= start:
-        raise ValueError("Model did not return JSON.")
-    return json.loads(text[start : end + 1])
+def _is_json_reply(text: str) -> bool:
+    try:
+        _extract_json(text)
+    except ValueError:
+        return False
+    return True
 
 
 def _get_provider(model_override: str | None = None) -> tuple[LLMProvider, str]:
@@ -168,6 +226,26 @@ def _get_provider(model_override: str | None = None) -> tuple[LLMProvider, str]:
     return OllamaProvider(host=host, model=model), model
 
 
+def _clone_repo(repo_url: str, root: Path) -> Repo:
+    """
+    Shallow partial clone: blobs are fetched only for paths that end up checked out,
+    so vendored/build output dirs are never downloaded.
+    """
+    repo = Repo.clone_from(
+        repo_url,
+        root,
+        multi_options=["--depth=1", "--filter=blob:none", "--sparse"],
+    )
+    patterns = ["/*"] + [f"!{d}/" for d in _SPARSE_EXCLUDE_DIRS]
+    try:
+        repo.git.sparse_checkout("set", "--no-cone", *patterns)
+    except BaseException:
+        # don't leak the cat-file helper when the caller never gets the Repo to close
+        repo.close()
+        raise
+    return repo
+
+
 def _system_instructions(mode: str) -> str:
     base = """You are RepoSensei 🥋 — a staff-level software engineer who onboards developers onto unfamiliar repositories.
 
@@ -217,41 +295,238 @@ Constraints:
 """
 
 
-def analyze_repo(
+SHARD_CONTRACT = """Return a JSON object with EXACT keys:
+{
+  "summary": string,
+  "tech_stack": [string],
+  "module_map": [
+    {"name": string, "purpose": string, "key_files": [string]}
+  ],
+  "improvements": [string]
+}
+
+Constraints:
+- All keys must be present. Use empty arrays if needed.
+- Describe ONLY the module whose files are shown below; key_files must be paths shown in the snippets.
+- summary: 2-4 sentences on what this module does and how it connects to the rest of the repo.
+- Only mention routes/capabilities supported by REPO SIGNALS or the snippets; otherwise write "Not confirmed in code".
+- Return ONLY JSON.
+"""
+
+# Fan out one LLM call per top-level module only when the stitched context is large
+# enough that a single call would be slow; small repos keep the single-call path.
+SHARD_MIN_CONTEXT_CHARS = 60_000
+MAX_SHARDS = 6
+
+
+def _group_files_by_module(root: Path, important: list[Path]) -> dict[str, list[Path]]:
+    """
+    Group picked files by top-level directory ("(root)" for files at the repo root).
+    At most MAX_SHARDS groups: the smallest groups are folded into "(other)".
+    """
+    groups: dict[str, list[Path]] = {}
+    for p in important:
+        parts = p.relative_to(root).parts
+        key = parts[0] if len(parts) > 1 else "(root)"
+        groups.setdefault(key, []).append(p)
+
+    if len(groups) <= MAX_SHARDS:
+        return groups
+
+    ranked = sorted(groups.items(), key=lambda kv: len(kv[1]), reverse=True)
+    out = dict(ranked[: MAX_SHARDS - 1])
+    out["(other)"] = [p for _, files in ranked[MAX_SHARDS - 1 :] for p in files]
+    return out
+
+
+def _collect_context(repo_url: str) -> tuple[str, dict, str, str, dict[str, str]]:
+    """
+    Blocking half of the pipeline: clone, signals, tree, file snippets.
+    Returns (commit_sha, signals, tree, file_text, shard_texts); shard_texts is empty
+    unless the context is big enough to be split per module.
+    The checkout lives only inside this call, so its rmtree also runs off the event loop.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+
+        # closing the Repo stops the git cat-file helper that reading HEAD spawns
+        with _clone_repo(repo_url, root) as repo:
+            commit_sha = repo.head.commit.hexsha
+
+        # file bytes shared by the signals route scan and every read_files call below;
+        # owned by this analysis, so it goes away with the checkout
+        read_cache: dict[Path, bytes] = {}
+
+        # signals/tree and file picking/reading are independent walks over the fresh
+        # checkout; both are mostly scandir/stat/read syscalls, so overlap them.
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            signals_future = ex.submit(build_signals_cached, root, commit_sha, read_cache)
+            tree_future = ex.submit(build_tree, root)
+            important = pick_important_files(root)
+            file_text = read_files(root, important, read_cache=read_cache)
+            signals = signals_future.result()
+            tree = tree_future.result()
+
+        shard_texts: dict[str, str] = {}
+        if len(file_text) >= SHARD_MIN_CONTEXT_CHARS:
+            groups = _group_files_by_module(root, important)
+            if len(groups) >= 2:
+                shard_texts = {
+                    name: read_files(root, files, read_cache=read_cache) for name, files in groups.items()
+                }
+
+    return commit_sha, signals, tree, file_text, shard_texts
+
+
+def _repo_header(repo_url: str, model_used: str, signals: dict) -> str:
+    return (
+        f"Repo URL: {repo_url}\n"
+        f"Model: {model_used}\n\n"
+        "REPO SIGNALS (ground truth hints):\n"
+        f"{orjson.dumps(signals, option=orjson.OPT_INDENT_2).decode()}\n\n"
+    )
+
+
+def _str_items(value) -> list[str]:
+    return [x for x in value if isinstance(x, str)] if isinstance(value, list) else []
+
+
+async def _analyze_sharded(
+    llm: LLMProvider,
+    system: str,
+    header: str,
+    tree: str,
+    shard_texts: dict[str, str],
+) -> dict:
+    """
+    One call per module (run concurrently), then one synthesis call over the module
+    summaries for overview/flows/diagram. Shard module maps are merged into the result.
+    """
+    names = list(shard_texts)
+    prompts = [
+        SHARD_CONTRACT
+        + "\n"
+        + header
+        + f"MODULE: {name}\n\n"
+        "MODULE FILE CONTENTS (snippets):\n"
+        f"{shard_texts[name]}\n\n"
+        "Return ONLY the JSON object described at the top."
+        for name in names
+    ]
+    # submit every shard first, then wait on all of them together
+    raws = await asyncio.gather(*(llm.agenerate(system=system, user=p) for p in prompts))
+
+    shards: list[dict] = []
+    for name, raw in zip(names, raws):
+        try:
+            shard = _extract_json(raw)
+        except ValueError:
+            continue
+        if isinstance(shard, dict):
+            shard["module"] = name
+            shards.append(shard)
+
+    summaries = [
+        {
+            "module": sh["module"],
+            "summary": sh.get("summary", ""),
+            "module_map": sh.get("module_map", []),
+        }
+        for sh in shards
+    ]
+    synth_prompt = (
+        JSON_CONTRACT
+        + "\n"
+        + header
+        + "FILE TREE:\n"
+        f"{tree}\n\n"
+        "MODULE SUMMARIES (from per-module analysis of the file snippets):\n"
+        f"{orjson.dumps(summaries, option=orjson.OPT_INDENT_2).decode()}\n\n"
+        "Return ONLY the JSON object described at the top."
+    )
+    data = _extract_json(await llm.agenerate(system=system, user=synth_prompt))
+
+    # shard items must be valid ModuleItems; one malformed item must not fail the report
+    module_map: list[dict] = []
+    for sh in shards:
+        items = sh.get("module_map")
+        if not isinstance(items, list):
+            continue
+        for m in items:
+            try:
+                module_map.append(msgspec.to_builtins(msgspec.convert(m, type=ModuleItem)))
+            except msgspec.ValidationError:
+                continue
+    if module_map:
+        data["module_map"] = module_map
+    data["tech_stack"] = list(
+        dict.fromkeys(_str_items(data.get("tech_stack")) + [t for sh in shards for t in _str_items(sh.get("tech_stack"))])
+    )
+    data["improvements"] = list(
+        dict.fromkeys(_str_items(data.get("improvements")) + [t for sh in shards for t in _str_items(sh.get("improvements"))])
+    )
+    return data
+
+
+async def aanalyze_repo(
     repo_url: str,
     model_override: str | None = None,
     return_signals: bool = False,
 ):
     llm, model_used = _get_provider(model_override)
     mode = (os.getenv("RESPONSE_MODE") or "strict").strip().lower()
+    system = _system_instructions(mode)
 
-    with tempfile.TemporaryDirectory() as tmp:
-        root = Path(tmp)
-        Repo.clone_from(repo_url, root, depth=1)
-
-        signals = build_signals(root)
-        tree = build_tree(root)
-        important = pick_important_files(root)
-        file_text = read_files(root, important)
-
-        prompt = (
-            f"Repo URL: {repo_url}\n"
-            f"Model: {model_used}\n\n"
-            "REPO SIGNALS (ground truth hints):\n"
-            f"{json.dumps(signals, indent=2)}\n\n"
-            "FILE TREE:\n"
-            f"{tree}\n\n"
-            "IMPORTANT FILE CONTENTS (snippets):\n"
-            f"{file_text}\n\n"
-            + JSON_CONTRACT
+    try:
+        commit_sha, signals, tree, file_text, shard_texts = await asyncio.to_thread(
+            _collect_context, repo_url
         )
 
-        raw = llm.generate(system=_system_instructions(mode), user=prompt)
-        data = _extract_json(raw)
+        cached_llm = CachedLLM(
+            llm, model=model_used, commit_sha=commit_sha, mode=mode, is_valid=_is_json_reply
+        )
+        header = _repo_header(repo_url, model_used, signals)
+
+        if shard_texts:
+            data = await _analyze_sharded(cached_llm, system, header, tree, shard_texts)
+        else:
+            # Stable text first (contract), per-repo text last: providers cache prompt
+            # prefixes, so the contract bytes stay cache-eligible across repos.
+            prompt = (
+                JSON_CONTRACT
+                + "\n"
+                + header
+                + "FILE TREE:\n"
+                f"{tree}\n\n"
+                "IMPORTANT FILE CONTENTS (snippets):\n"
+                f"{file_text}\n\n"
+                "Return ONLY the JSON object described at the top."
+            )
+            data = _extract_json(await cached_llm.agenerate(system=system, user=prompt))
+    finally:
+        await llm.aclose()
+
+    data = _sanitize_report_dict(data, signals, mode)
+
+    report = msgspec.convert(data, type=RepoReport)
+    if return_signals:
+        return report, signals
+    return report
 
-        data = _sanitize_report_dict(data, signals, mode)
 
-        report = RepoReport.model_validate(data)
-        if return_signals:
-            return report, signals
-        return report
\ No newline at end of file
+def analyze_repo(
+    repo_url: str,
+    model_override: str | None = None,
+    return_signals: bool = False,
+):
+    """
+    Blocking wrapper for scripts/CLI. Inside a running event loop (FastAPI, notebooks)
+    await aanalyze_repo instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("analyze_repo() cannot be called from a running event loop; await aanalyze_repo() instead")
+    return asyncio.run(aanalyze_repo(repo_url, model_override=model_override, return_signals=return_signals))
\ No newline at end of file
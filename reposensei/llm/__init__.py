@@ -1,3 +1,4 @@
 from .base import LLMProvider
+from .cache import CachedLLM
 from .ollama import OllamaProvider
 from .openai_provider import OpenAIProvider
\ No newline at end of file
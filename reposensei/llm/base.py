@@ -1,7 +1,16 @@
+import asyncio
 from abc import ABC, abstractmethod
 
 
 class LLMProvider(ABC):
     @abstractmethod
     def generate(self, system: str, user: str) -> str:
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    async def agenerate(self, system: str, user: str) -> str:
+        # Providers with a native async client override this.
+        return await asyncio.to_thread(self.generate, system, user)
+
+    async def aclose(self) -> None:
+        # Release async clients tied to the current event loop.
+        return None
\ No newline at end of file
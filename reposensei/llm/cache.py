@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Callable
+
+from reposensei.llm.base import LLMProvider
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    prompt_hash TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    response_text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    ttl_days REAL NOT NULL
+)
+"""
+
+
+def _cache_path() -> Path:
+    cache_dir = os.getenv("REPOSENSEI_CACHE_DIR") or str(Path.home() / ".reposensei")
+    return Path(cache_dir).expanduser() / "cache.sqlite"
+
+
+def _cache_ttl_days() -> float:
+    try:
+        return float(os.getenv("REPOSENSEI_CACHE_TTL_DAYS") or 7)
+    except ValueError:
+        return 7.0
+
+
+class CachedLLM(LLMProvider):
+    """
+    Wraps a provider and stores raw model output on disk, keyed by
+    sha256(commit_sha | model | mode | prompt). A TTL of 0 disables the cache.
+    Only responses that pass is_valid (and are not blank) are stored, so a bad reply
+    is retried on the next request instead of being replayed for the whole TTL.
+    """
+
+    def __init__(
+        self,
+        llm: LLMProvider,
+        model: str,
+        commit_sha: str,
+        mode: str,
+        is_valid: Callable[[str], bool] | None = None,
+    ):
+        self.llm = llm
+        self.model = model
+        self.commit_sha = commit_sha
+        self.mode = mode
+        self.is_valid = is_valid
+        self.provider = type(llm).__name__
+        self.ttl_days = _cache_ttl_days()
+        self.path = _cache_path()
+
+    def _key(self, user: str) -> str:
+        raw = f"{self.commit_sha}|{self.model}|{self.mode}|{user}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(_SCHEMA)
+        return conn
+
+    def _lookup(self, key: str) -> str | None:
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT response_text, created_at, ttl_days FROM llm_cache WHERE prompt_hash = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        response_text, created_at, ttl_days = row
+        if time.time() - created_at > ttl_days * 86_400:
+            return None
+        return response_text
+
+    def _store(self, key: str, response_text: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(prompt_hash, model, provider, response_text, created_at, ttl_days) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.model, self.provider, response_text, time.time(), self.ttl_days),
+            )
+
+    def _try_lookup(self, key: str) -> str | None:
+        try:
+            return self._lookup(key)
+        except (sqlite3.Error, OSError):
+            return None
+
+    def _should_store(self, response_text: str) -> bool:
+        if not response_text.strip():
+            return False
+        return self.is_valid is None or self.is_valid(response_text)
+
+    def _try_store(self, key: str, response_text: str) -> None:
+        try:
+            self._store(key, response_text)
+        except (sqlite3.Error, OSError):
+            pass
+
+    def generate(self, system: str, user: str) -> str:
+        if self.ttl_days <= 0:
+            return self.llm.generate(system=system, user=user)
+
+        key = self._key(user)
+        hit = self._try_lookup(key)
+        if hit is not None:
+            return hit
+
+        raw = self.llm.generate(system=system, user=user)
+        if self._should_store(raw):
+            self._try_store(key, raw)
+        return raw
+
+    async def agenerate(self, system: str, user: str) -> str:
+        if self.ttl_days <= 0:
+            return await self.llm.agenerate(system=system, user=user)
+
+        # sqlite calls block; keep them off the event loop
+        key = self._key(user)
+        hit = await asyncio.to_thread(self._try_lookup, key)
+        if hit is not None:
+            return hit
+
+        raw = await self.llm.agenerate(system=system, user=user)
+        if self._should_store(raw):
+            await asyncio.to_thread(self._try_store, key, raw)
+        return raw
+
+    async def aclose(self) -> None:
+        await self.llm.aclose()
\ No newline at end of file
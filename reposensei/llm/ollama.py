@@ -1,24 +1,118 @@
-import requests
+import asyncio
+import json
+import threading
+import time
+
+import httpx
 from reposensei.llm.base import LLMProvider
 
+# Statuses worth retrying with backoff (model loading / overloaded server)
+_RETRY_STATUSES = {429, 503}
+_MAX_ATTEMPTS = 4
+_BACKOFF_BASE = 1.0
+
+# One pooled client per host, shared across requests so TCP connections are reused.
+_clients: dict[str, httpx.Client] = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(host: str) -> httpx.Client:
+    with _clients_lock:
+        client = _clients.get(host)
+        if client is None:
+            client = httpx.Client(
+                base_url=host,
+                timeout=300,
+                transport=httpx.HTTPTransport(retries=3),
+            )
+            _clients[host] = client
+        return client
+
+
+# AsyncClient is bound to the loop it first runs on, so async clients are pooled per
+# (running loop, host). Entries for closed loops (e.g. after asyncio.run returns) are dropped.
+_aclients: dict[asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]] = {}
+
+
+def _get_async_client(host: str) -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        for stale in [lp for lp in _aclients if lp.is_closed()]:
+            del _aclients[stale]
+        per_loop = _aclients.setdefault(loop, {})
+        client = per_loop.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=host,
+                timeout=300,
+                transport=httpx.AsyncHTTPTransport(retries=3),
+            )
+            per_loop[host] = client
+        return client
+
+
+def _chunk_content(line: str) -> tuple[str, bool]:
+    """
+    Parse one NDJSON line of a streamed /api/chat response into (content, done).
+    """
+    chunk = json.loads(line)
+    if "error" in chunk:
+        raise RuntimeError(f"Ollama error: {chunk['error']}")
+    return (chunk.get("message") or {}).get("content", ""), bool(chunk.get("done"))
+
 
 class OllamaProvider(LLMProvider):
     def __init__(self, host: str, model: str):
         self.host = host.rstrip("/")
         self.model = model
+        self._session = _get_client(self.host)
 
-    def generate(self, system: str, user: str) -> str:
-        url = f"{self.host}/api/chat"
-        payload = {
+    def _payload(self, system: str, user: str) -> dict:
+        return {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": system},
                 {"role": "user", "content": user},
             ],
-            "stream": False,
+            "stream": True,
             "options": {"temperature": 0.2},
         }
-        r = requests.post(url, json=payload, timeout=300)
-        r.raise_for_status()
-        data = r.json()
-        return data["message"]["content"]
\ No newline at end of file
+
+    def generate(self, system: str, user: str) -> str:
+        payload = self._payload(system, user)
+        attempt = 0
+        while True:
+            with self._session.stream("POST", "/api/chat", json=payload) as r:
+                if r.status_code not in _RETRY_STATUSES or attempt == _MAX_ATTEMPTS - 1:
+                    r.raise_for_status()
+                    # collect chunks and join once; += on a str would be quadratic
+                    parts: list[str] = []
+                    for line in r.iter_lines():
+                        if not line:
+                            continue
+                        # read through "done" (the last line) so the connection goes back to the pool
+                        content, _ = _chunk_content(line)
+                        parts.append(content)
+                    return "".join(parts)
+            time.sleep(_BACKOFF_BASE * 2**attempt)
+            attempt += 1
+
+    async def agenerate(self, system: str, user: str) -> str:
+        # shared across requests on this loop; never closed per request
+        asession = _get_async_client(self.host)
+        payload = self._payload(system, user)
+        attempt = 0
+        while True:
+            async with asession.stream("POST", "/api/chat", json=payload) as r:
+                if r.status_code not in _RETRY_STATUSES or attempt == _MAX_ATTEMPTS - 1:
+                    r.raise_for_status()
+                    parts: list[str] = []
+                    async for line in r.aiter_lines():
+                        if not line:
+                            continue
+                        # read through "done" (the last line) so the connection goes back to the pool
+                        content, _ = _chunk_content(line)
+                        parts.append(content)
+                    return "".join(parts)
+            await asyncio.sleep(_BACKOFF_BASE * 2**attempt)
+            attempt += 1
\ No newline at end of file
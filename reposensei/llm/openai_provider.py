@@ -1,9 +1,9 @@
 from reposensei.llm.base import LLMProvider
 
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI, OpenAI
 except Exception:  # pragma: no cover
-    OpenAI = None  # type: ignore
+    AsyncOpenAI = OpenAI = None  # type: ignore
 
 
 class OpenAIProvider(LLMProvider):
@@ -11,14 +11,31 @@ class OpenAIProvider(LLMProvider):
         if OpenAI is None:
             raise RuntimeError("openai package not installed. pip install openai")
         self.client = OpenAI(api_key=api_key)
+        self.aclient = AsyncOpenAI(api_key=api_key)
         self.model = model
 
+    def _input(self, system: str, user: str) -> list[dict]:
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ]
+
     def generate(self, system: str, user: str) -> str:
-        resp = self.client.responses.create(
-            model=self.model,
-            input=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-        )
-        return resp.output_text
\ No newline at end of file
+        # stream so long generations don't sit behind one blocking read; join deltas once
+        parts: list[str] = []
+        with self.client.responses.stream(model=self.model, input=self._input(system, user)) as stream:
+            for event in stream:
+                if event.type == "response.output_text.delta":
+                    parts.append(event.delta)
+        return "".join(parts)
+
+    async def agenerate(self, system: str, user: str) -> str:
+        parts: list[str] = []
+        async with self.aclient.responses.stream(model=self.model, input=self._input(system, user)) as stream:
+            async for event in stream:
+                if event.type == "response.output_text.delta":
+                    parts.append(event.delta)
+        return "".join(parts)
+
+    async def aclose(self) -> None:
+        await self.aclient.close()
\ No newline at end of file
@@ -1,19 +1,20 @@
 from typing import List
-from pydantic import BaseModel
 
+import msgspec
 
-class ModuleItem(BaseModel):
+
+class ModuleItem(msgspec.Struct):
     name: str
     purpose: str
     key_files: List[str]
 
 
-class FlowItem(BaseModel):
+class FlowItem(msgspec.Struct):
     name: str
     steps: List[str]
 
 
-class RepoReport(BaseModel):
+class RepoReport(msgspec.Struct):
     repo_name: str
     tech_stack: List[str]
     overview: str
@@ -1,8 +1,16 @@
 from __future__ import annotations
 
 from pathlib import Path
-from collections import Counter
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
 import re
+import threading
+
+import orjson
+
+from reposensei.utils import read_bytes_cached
 
 _EXT_LANG = {
     ".py": "Python",
@@ -72,95 +80,130 @@ _ENTRYPOINT_FILES_ANYWHERE = {
     "main.go", "Main.java", "main.java",
 }
 
-_ROUTE_RE = re.compile(r'(["\'])(/[^"\']+)\1')
-
-
-def _iter_files(root: Path):
-    for p in root.rglob("*"):
-        if not p.is_file():
-            continue
-        if set(p.parts) & _IGNORE_DIRS:
+# If we see multiple manifests in different dirs, that’s a hint (not a conclusion).
+_MANIFEST_NAMES = {"package.json", "pyproject.toml", "go.mod", "pom.xml", "build.gradle", "build.gradle.kts"}
+
+# Only files matching these ever feed a signal; the walker drops everything else.
+_RELEVANT_NAMES = frozenset(_ENTRYPOINT_FILES_NEAR_ROOT | _ENTRYPOINT_FILES_ANYWHERE | _MANIFEST_NAMES)
+_RELEVANT_SUFFIXES = frozenset(_EXT_LANG)
+
+# Routes are ASCII syntax, so scan raw bytes (no decode of the whole file).
+# Bounded, whitespace-free body keeps backtracking short on long string literals.
+_ROUTE_RE = re.compile(rb'(["\'])(/[^"\'\s]{1,60})\1')
+
+# Long files are only scanned on lines that look like route declarations.
+_ROUTE_PREFILTER_MIN_BYTES = 20_000
+_ROUTE_LINE_HINTS = (
+    b"route", b"Route", b"@app.", b"@router.", b"path=", b"path(", b"url(",
+    b".get(", b".post(", b".put(", b".patch(", b".delete(",
+)
+
+
+# build_signals results keyed by commit SHA (serialized so callers always get a fresh dict)
+_SIGNALS_CACHE_MAX = 128
+_signals_cache: OrderedDict[str, bytes] = OrderedDict()
+_signals_cache_lock = threading.Lock()
+
+
+def _read_route_source(fp: Path, read_cache: dict[Path, bytes] | None = None) -> bytes:
+    try:
+        raw = read_bytes_cached(fp, read_cache)
+    except Exception:
+        return b""
+    # NUL in the first block means binary content
+    if b"\0" in raw[:512]:
+        return b""
+    return raw
+
+
+def _route_scan_bytes(raw: bytes) -> bytes:
+    if len(raw) <= _ROUTE_PREFILTER_MIN_BYTES:
+        return raw
+    return b"\n".join(
+        line for line in raw.splitlines() if any(h in line for h in _ROUTE_LINE_HINTS)
+    )
+
+
+def _walk(root: Path):
+    """
+    Yield (name, rel_posix, suffix) for signal-relevant files under root, pruning ignored dirs.
+    """
+    root_str = str(root)
+    stack = [("", root_str)]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        try:
+            it = os.scandir(abs_dir)
+        except OSError:
             continue
-        yield p
-
-
-def build_signals(root: Path) -> dict:
+        with it:
+            for entry in it:
+                name = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in _IGNORE_DIRS:
+                        stack.append((f"{rel_dir}/{name}" if rel_dir else name, entry.path))
+                    continue
+                suffix = os.path.splitext(name)[1].lower()
+                if name in _RELEVANT_NAMES or suffix in _RELEVANT_SUFFIXES:
+                    if entry.is_file(follow_symlinks=False):
+                        yield name, (f"{rel_dir}/{name}" if rel_dir else name), suffix
+
+
+def build_signals(root: Path, read_cache: dict[Path, bytes] | None = None) -> dict:
     root = Path(root)
 
-    # --------- languages ----------
+    # --------- single walk: languages, entrypoints, manifests ----------
     lang_counts: Counter[str] = Counter()
-    for p in _iter_files(root):
-        lang = _EXT_LANG.get(p.suffix.lower())
+    ep_root: list[str] = []
+    ep_any: list[str] = []
+    manifest_paths: list[str] = []
+
+    for name, rel, suffix in _walk(root):
+        lang = _EXT_LANG.get(suffix)
         if lang:
             lang_counts[lang] += 1
+        if name in _ENTRYPOINT_FILES_NEAR_ROOT and rel.count("/") <= 1:
+            ep_root.append(rel)
+        if name in _ENTRYPOINT_FILES_ANYWHERE:
+            ep_any.append(rel)
+        if name in _MANIFEST_NAMES:
+            manifest_paths.append(rel)
 
     language_rank = [k for k, _ in lang_counts.most_common()]
     languages = list(language_rank)
     primary_language = language_rank[0] if language_rank else None
 
-    # --------- entrypoints near root ----------
-    entrypoints_near_root: list[str] = []
-    for p in _iter_files(root):
-        rel = p.relative_to(root).as_posix()
-        if rel.count("/") <= 1 and p.name in _ENTRYPOINT_FILES_NEAR_ROOT:
-            entrypoints_near_root.append(rel)
-
-    # dedupe preserve order
-    seen = set()
-    ep_root: list[str] = []
-    for e in entrypoints_near_root:
-        if e not in seen:
-            seen.add(e)
-            ep_root.append(e)
-
-    # --------- entrypoints anywhere (high-signal filenames) ----------
-    entrypoints_anywhere: list[str] = []
-    for p in _iter_files(root):
-        if p.name in _ENTRYPOINT_FILES_ANYWHERE:
-            entrypoints_anywhere.append(p.relative_to(root).as_posix())
-
-    seen2 = set()
-    ep_any: list[str] = []
-    for e in entrypoints_anywhere:
-        if e not in seen2:
-            seen2.add(e)
-            ep_any.append(e)
-
     # --------- monorepo hint ----------
-    # If we see multiple manifests in different dirs, that’s a hint (not a conclusion).
-    manifest_names = {"package.json", "pyproject.toml", "go.mod", "pom.xml", "build.gradle", "build.gradle.kts"}
-    manifest_paths = []
-    for p in _iter_files(root):
-        if p.name in manifest_names:
-            manifest_paths.append(p.relative_to(root).as_posix())
     monorepo_hint = len({Path(x).parent.as_posix() for x in manifest_paths}) >= 2
 
     # --------- routes_sample (lightweight) ----------
     routes_sample: list[str] = []
     candidates: list[Path] = []
 
-    # prefer scanning entrypoint-ish code files
+    # prefer scanning entrypoint-ish code files; the walk only yields regular files,
+    # so these need no exists()/is_file() stats
     for rel in ep_root + ep_any:
         if rel.endswith((".py", ".js", ".ts")):
-            fp = root / rel
-            if fp.exists() and fp.is_file():
-                candidates.append(fp)
+            candidates.append(root / rel)
 
-    # fallback if none
+    # fallback if none (every fallback name is an "anywhere" entrypoint, so the walk saw it)
+    walked_any = set(ep_any)
     for fallback in ["app.py", "main.py", "server.py", "index.js", "src/index.js"]:
-        fp = root / fallback
-        if fp.exists() and fp.is_file():
-            candidates.append(fp)
+        if fallback in walked_any:
+            candidates.append(root / fallback)
 
-    for fp in candidates[:6]:
-        try:
-            txt = fp.read_text(errors="ignore")
-        except Exception:
-            continue
-        for m in _ROUTE_RE.finditer(txt):
-            route = m.group(2)
-            if route.startswith("/") and len(route) <= 60:
-                routes_sample.append(route)
+    # the same file is often both an entrypoint and a fallback; read it once
+    candidates = list(dict.fromkeys(candidates))[:6]
+
+    # reads are I/O-bound (GIL released), so fetch all candidates concurrently
+    sources: list[bytes] = []
+    if candidates:
+        with ThreadPoolExecutor(max_workers=len(candidates)) as ex:
+            sources = list(ex.map(functools.partial(_read_route_source, read_cache=read_cache), candidates))
+
+    for raw in sources:
+        for m in _ROUTE_RE.finditer(_route_scan_bytes(raw)):
+            routes_sample.append(m.group(2).decode("utf-8", "ignore"))
 
     rs_seen = set()
     routes_sample2: list[str] = []
@@ -182,4 +225,25 @@ def build_signals(root: Path) -> dict:
         "routes_sample": routes_sample2[:20],
         "framework_hints": [],          # intentionally empty (no hardcoding)
         "capability_evidence": {},      # keep for later expansion
-    }
\ No newline at end of file
+    }
+
+
+def build_signals_cached(root: Path, commit_sha: str, read_cache: dict[Path, bytes] | None = None) -> dict:
+    """
+    build_signals memoized per commit: the tree for a SHA never changes, and keying
+    by SHA (not the temp clone path) lets repeat analyses of the same commit hit.
+    """
+    with _signals_cache_lock:
+        hit = _signals_cache.get(commit_sha)
+        if hit is not None:
+            _signals_cache.move_to_end(commit_sha)
+    if hit is not None:
+        return orjson.loads(hit)
+
+    signals = build_signals(root, read_cache)
+    with _signals_cache_lock:
+        _signals_cache[commit_sha] = orjson.dumps(signals)
+        _signals_cache.move_to_end(commit_sha)
+        while len(_signals_cache) > _SIGNALS_CACHE_MAX:
+            _signals_cache.popitem(last=False)
+    return signals
\ No newline at end of file
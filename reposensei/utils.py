@@ -1,8 +1,15 @@
 from __future__ import annotations
 
 from pathlib import Path
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, namedtuple
+import ast
+import functools
+import heapq
+import itertools
+import os
 import re
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 IGNORE_DIRS = {
     ".git", "node_modules", "dist", "build", "target", "vendor",
@@ -41,53 +48,176 @@ ENTRY_FILENAMES = {
     "main.java",
 }
 
+# Fallback-scoring hints: filename endings, and path substrings matched in one regex pass each
+ROUTE_FILE_SUFFIXES = ("routes.py", "router.py", "handlers.go", "controller.ts", "controller.js", "urls.py")
+ROUTE_HINT_RE = re.compile(r"route|router|controller|handler|endpoint|service")
+CONFIG_HINT_RE = re.compile(r"config|settings|infra|deploy|\.github")
+
 # --- regexes for lightweight import scanning (generic, not framework-specific) ---
-PY_IMPORT_RE = re.compile(r"^\s*(?:from\s+([a-zA-Z0-9_\.]+)\s+import|import\s+([a-zA-Z0-9_\.]+))", re.M)
-JS_IMPORT_RE = re.compile(r"^\s*import\s+.*?from\s+['\"](.+?)['\"]\s*;?\s*$", re.M)
-JS_REQUIRE_RE = re.compile(r"require\(\s*['\"](.+?)['\"]\s*\)")
-GO_IMPORT_RE = re.compile(r'^\s*import\s*(?:\(\s*)?["\']([^"\']+)["\']', re.M)
+# google-re2 (optional) runs these as a DFA with no backtracking; stdlib re is the fallback.
+# Multiline is set inline, since re2 does not take re module flags. Patterns are bytes:
+# import syntax is ASCII, so files are scanned undecoded and only captures are decoded.
+try:
+    import re2 as _import_re
+except ImportError:  # pragma: no cover
+    _import_re = re
+
+PY_IMPORT_RE = _import_re.compile(rb"(?m)^\s*(?:from\s+([a-zA-Z0-9_\.]+)\s+import|import\s+([a-zA-Z0-9_\.]+))")
+# import ... from "x" and require("x") in one alternation, so JS/TS text is scanned once
+JS_IMPORT_OR_REQUIRE_RE = _import_re.compile(
+    rb"(?m)(?:^\s*import\s+.*?from\s+['\"](?P<imp>.+?)['\"]\s*;?\s*$)"
+    rb"|(?:require\(\s*['\"](?P<req>.+?)['\"]\s*\))"
+)
+GO_IMPORT_RE = _import_re.compile(rb'(?m)^\s*import\s*(?:\(\s*)?["\']([^"\']+)["\']')
+
+
+# One scanned file; path is the absolute path str (Path objects are only built for results),
+# suffix is lowercased, size comes from the scan's single stat.
+# The lower_* fields are what the scoring loop reads, computed once here.
+FileInfo = namedtuple(
+    "FileInfo",
+    "path relposix parts name lower_name lower_relstr stem suffix size",
+)
+
+
+def _iter_file_entries(root: Path):
+    """
+    Yield a DirEntry for every file under root. Ignored dirs are pruned before
+    descending, so .git / node_modules / venvs are never listed; dirent types avoid extra stats.
+    """
+    stack = [str(root)]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    if e.name not in IGNORE_DIRS:
+                        stack.append(e.path)
+                elif e.is_file(follow_symlinks=False):
+                    yield e
 
 
-def iter_repo_files(root: Path):
-    for p in root.rglob("*"):
-        if any(part in IGNORE_DIRS for part in p.parts):
+def _scan_repo(root: Path) -> list[FileInfo]:
+    """
+    Walk the repo once; every view the picker needs is derived from this list in memory.
+    """
+    files: list[FileInfo] = []
+    prefix_len = len(os.path.join(str(root), ""))
+    sep = os.sep
+    for e in _iter_file_entries(root):
+        try:
+            size = e.stat(follow_symlinks=False).st_size
+        except OSError:
             continue
-        if p.is_file():
-            yield p
+        # rel path by slicing the entry path; no PurePath parse / relative_to per file
+        relstr = e.path[prefix_len:]
+        relposix = relstr if sep == "/" else relstr.replace(sep, "/")
+        name = e.name
+        # stem/suffix from the name string, same rules as PurePath without re-parsing
+        dot = name.rfind(".")
+        if 0 < dot < len(name) - 1:
+            stem, suffix = name[:dot], name[dot:].lower()
+        else:
+            stem, suffix = name, ""
+        files.append(
+            FileInfo(
+                e.path, relposix, tuple(relposix.split("/")),
+                name, name.lower(), relstr.lower(), stem, suffix, size,
+            )
+        )
+    return files
 
 
 def build_tree(root: Path, max_entries: int = 600) -> str:
-    lines = []
-    count = 0
-    for p in sorted(iter_repo_files(root), key=lambda x: str(x)):
-        rel = p.relative_to(root)
-        lines.append(str(rel))
-        count += 1
-        if count >= max_entries:
-            lines.append("... (truncated)")
-            break
+    # partial sort: only the first max_entries paths are ever shown
+    prefix_len = len(os.path.join(str(root), ""))
+    lines = heapq.nsmallest(max_entries, (e.path[prefix_len:] for e in _iter_file_entries(root)))
+    if len(lines) >= max_entries:
+        lines.append("... (truncated)")
     return "\n".join(lines)
 
 
-def _safe_read_text(p: Path, max_chars: int = 120_000) -> str:
+# Thread count for overlapped file reads; I/O bound, decode still holds the GIL
+_READ_WORKERS = 8
+
+
+def _safe_read_bytes(p: str | Path, max_bytes: int = 120_000) -> bytes:
     try:
-        return p.read_text(errors="ignore")[:max_chars]
+        # bounded read: never pulls more than max_bytes off disk
+        with open(p, "rb") as f:
+            return f.read(max_bytes)
     except Exception:
-        return ""
+        return b""
 
 
-def _build_basename_index(root: Path) -> dict[str, list[Path]]:
+def read_bytes_cached(fp: Path, cache: dict[Path, bytes] | None = None) -> bytes:
     """
-    Map "foo" -> [foo.py, foo.js, foo.ts, ...] for repo-local matching.
+    Whole-file bytes shared by every reader in one analysis (signals route scan, read_files).
+    cache is owned by that analysis (created in _collect_context), so concurrent requests
+    never see or clear each other's entries. Files over SNIPPET_FULL_READ_MAX_BYTES are
+    read but not kept, so one big bundle can't stay resident for the whole analysis.
     """
-    idx: dict[str, list[Path]] = defaultdict(list)
-    for p in iter_repo_files(root):
-        stem = p.stem.lower()
-        idx[stem].append(p)
-    return idx
+    if cache is None:
+        return fp.read_bytes()
+    data = cache.get(fp)
+    if data is None:
+        data = fp.read_bytes()
+        if len(data) <= SNIPPET_FULL_READ_MAX_BYTES:
+            cache[fp] = data
+    return data
+
+
+def _build_basename_index(files: list[FileInfo]) -> dict[str, tuple[int, ...]]:
+    """
+    Map "foo" -> ids of foo.py, foo.js, foo.ts, ... for repo-local matching.
+    A file's id is its index in files, so matches go straight into refs.
+    """
+    idx: dict[str, list[int]] = defaultdict(list)
+    for i, fi in enumerate(files):
+        idx[fi.stem.lower()].append(i)
+    return {k: tuple(v) for k, v in idx.items()}
+
+
+# Import-centrality sources: code-ish files only; tiny files carry no imports worth
+# counting and huge or bundled ones are usually generated
+_IMPORT_SOURCE_SUFFIXES = {".py", ".js", ".ts", ".tsx", ".jsx", ".go"}
+_GENERATED_SUFFIXES = (".min.js", ".bundle.js")
+
+
+# Per-file import-scan guards: cap matches, and skip big files whose tail is still dense
+# with imports (generated/vendored; real modules import at the top)
+_MAX_IMPORTS_PER_FILE = 100
+_DENSE_CHECK_MIN_BYTES = 60_000
+_DENSE_WINDOW_BYTES = 4_096
+_DENSE_BYTES_PER_MATCH = 200
+
+
+def _capped_matches(pattern, text: bytes):
+    if len(text) > _DENSE_CHECK_MIN_BYTES:
+        tail_hits = sum(1 for _ in pattern.finditer(text[-_DENSE_WINDOW_BYTES:]))
+        if tail_hits * _DENSE_BYTES_PER_MATCH > _DENSE_WINDOW_BYTES:
+            return ()
+    return itertools.islice(pattern.finditer(text), _MAX_IMPORTS_PER_FILE)
+
+
+def _is_import_source(fi: FileInfo) -> bool:
+    return (
+        fi.suffix in _IMPORT_SOURCE_SUFFIXES
+        and 1_000 <= fi.size <= 200_000
+        and not fi.lower_name.endswith(_GENERATED_SUFFIXES)
+    )
 
 
-def _collect_import_centrality(root: Path, max_files_to_scan: int = 250) -> tuple[Counter[str], Counter[str]]:
+def _collect_import_centrality(
+    root: Path,
+    files: list[FileInfo] | None = None,
+    max_files_to_scan: int = 250,
+    sources: list[tuple[int, FileInfo]] | None = None,
+) -> tuple[Counter[str], Counter[str]]:
     """
     Returns:
       - inbound_refs: Counter[file_rel] = how many times this file is referenced by others
@@ -98,83 +228,102 @@ def _collect_import_centrality(root: Path, max_files_to_scan: int = 250) -> tupl
     - JS/TS: import/require
     - Go: import "..."
     We only resolve "local-ish" imports (./, ../, or module basenames).
+    sources can be passed in when the caller already built it while classifying files
+    (see _pick_important_files).
     """
-    basename_idx = _build_basename_index(root)
+    if files is None:
+        files = _scan_repo(root)
+    if sources is None:
+        sources = [(i, fi) for i, fi in enumerate(files) if _is_import_source(fi)]
+    # bound once; looked up for every import match below
+    basename_idx_get = _build_basename_index(files).get
 
-    inbound_refs: Counter[str] = Counter()
-    outbound_refs: Counter[str] = Counter()
-
-    # Prefer scanning code-ish files only
-    code_suffixes = {".py", ".js", ".ts", ".tsx", ".jsx", ".go"}
-    candidates = []
-    for p in iter_repo_files(root):
-        if p.suffix.lower() in code_suffixes:
-            candidates.append(p)
+    # hot accumulators are plain int lists indexed by file id; Counters are built on return
+    inbound_refs = [0] * len(files)
+    outbound_refs = [0] * len(files)
 
     # scan up to N files (largest first gives more signal)
-    candidates.sort(key=lambda p: p.stat().st_size if p.exists() else 0, reverse=True)
-    candidates = candidates[:max_files_to_scan]
+    candidates = sorted(sources, key=lambda c: c[1].size, reverse=True)[:max_files_to_scan]
 
-    def relposix(p: Path) -> str:
-        return p.relative_to(root).as_posix()
+    # reads release the GIL, so overlap them; the regex scan below stays sequential
+    texts: list[bytes] = []
+    if candidates:
+        with ThreadPoolExecutor(max_workers=min(_READ_WORKERS, len(candidates))) as ex:
+            texts = list(ex.map(lambda c: _safe_read_bytes(c[1].path, max_bytes=80_000), candidates))
 
-    for src in candidates:
-        text = _safe_read_text(src, max_chars=80_000)
+    for (src_id, src), text in zip(candidates, texts):
         if not text:
             continue
 
-        src_rel = relposix(src)
-
-        refs: set[str] = set()
+        refs: set[int] = set()
 
-        suf = src.suffix.lower()
+        suf = src.suffix
 
         if suf == ".py":
-            for m in PY_IMPORT_RE.finditer(text):
-                mod = (m.group(1) or m.group(2) or "").strip()
+            for m in _capped_matches(PY_IMPORT_RE, text):
+                mod = (m.group(1) or m.group(2) or b"").decode("utf-8", "ignore").strip()
                 if not mod:
                     continue
                 base = mod.split(".")[-1].lower()
                 # match by basename index
-                for tgt in basename_idx.get(base, []):
-                    refs.add(relposix(tgt))
+                targets = basename_idx_get(base)
+                if targets:
+                    refs.update(targets)
 
         elif suf in {".js", ".ts", ".tsx", ".jsx"}:
-            for m in JS_IMPORT_RE.finditer(text):
-                path = m.group(1).strip()
-                if path.startswith("."):
-                    # local relative: ./foo or ../bar
-                    base = Path(path).name.split(".")[0].lower()
-                    for tgt in basename_idx.get(base, []):
-                        refs.add(relposix(tgt))
+            for m in _capped_matches(JS_IMPORT_OR_REQUIRE_RE, text):
+                # groups by position: re2 keys bytes-pattern group names as bytes
+                imp, req = m.groups()
+                path = (imp if imp is not None else req).decode("utf-8", "ignore").strip()
+                if imp is None or path.startswith("."):
+                    # require("...") or local relative: ./foo or ../bar
+                    base = path.rstrip("/").rsplit("/", 1)[-1].split(".")[0].lower()
                 else:
                     # module import: try basename match (repo-local)
                     base = path.split("/")[-1].split(".")[0].lower()
-                    for tgt in basename_idx.get(base, []):
-                        refs.add(relposix(tgt))
-
-            for m in JS_REQUIRE_RE.finditer(text):
-                path = m.group(1).strip()
-                base = Path(path).name.split(".")[0].lower()
-                for tgt in basename_idx.get(base, []):
-                    refs.add(relposix(tgt))
+                targets = basename_idx_get(base)
+                if targets:
+                    refs.update(targets)
 
         elif suf == ".go":
             # Go imports are module paths; basename match still works reasonably
-            for m in GO_IMPORT_RE.finditer(text):
-                imp = m.group(1).strip()
+            for m in _capped_matches(GO_IMPORT_RE, text):
+                imp = m.group(1).decode("utf-8", "ignore").strip()
                 base = imp.split("/")[-1].split(".")[0].lower()
-                for tgt in basename_idx.get(base, []):
-                    refs.add(relposix(tgt))
+                targets = basename_idx_get(base)
+                if targets:
+                    refs.update(targets)
 
         # Update counters
         if refs:
-            outbound_refs[src_rel] += len(refs)
-            for tgt_rel in refs:
-                if tgt_rel != src_rel:
-                    inbound_refs[tgt_rel] += 1
+            outbound_refs[src_id] += len(refs)
+            refs.discard(src_id)
+            for tgt_id in refs:
+                inbound_refs[tgt_id] += 1
 
-    return inbound_refs, outbound_refs
+    return (
+        Counter({files[i].relposix: n for i, n in enumerate(inbound_refs) if n}),
+        Counter({files[i].relposix: n for i, n in enumerate(outbound_refs) if n}),
+    )
+
+
+def _repo_fingerprint(root: Path) -> int:
+    """
+    Cheap change marker: one depth-1 scandir of root folding st_mtime_ns + st_size into a uint64.
+    Any top-level add/remove/touch changes it; edits deep in the tree do not.
+    """
+    fp = 0
+    try:
+        with os.scandir(root) as it:
+            for e in it:
+                try:
+                    st = e.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                fp = (fp + st.st_mtime_ns + st.st_size) & 0xFFFF_FFFF_FFFF_FFFF
+    except OSError:
+        return 0
+    return fp
 
 
 def pick_important_files(root: Path, max_files: int = 40) -> list[Path]:
@@ -185,97 +334,119 @@ def pick_important_files(root: Path, max_files: int = 40) -> list[Path]:
       2) Include likely entry files
       3) Include "central" files (imported by many others)
       4) Add scored fallbacks based on directory/file heuristics
+    Results are memoized on (root, max_files, _repo_fingerprint(root)).
     """
-    # 1) Always include priority files near root (depth <= 1)
-    pinned: list[Path] = []
-    for p in iter_repo_files(root):
-        rel = p.relative_to(root).as_posix()
-        if rel.count("/") <= 1 and p.name in PRIORITY_FILES:
-            pinned.append(p)
+    return list(_pick_important_files_cached(str(root), max_files, _repo_fingerprint(root)))
 
-    # ensure README first if present
-    for rn in ["README.md", "README.rst", "README.txt"]:
-        rp = root / rn
-        if rp.exists() and rp not in pinned:
-            pinned.insert(0, rp)
-
-    # 2) Likely entry files (anywhere)
-    entry: list[Path] = []
-    for p in iter_repo_files(root):
-        if p.name.lower() in ENTRY_FILENAMES:
-            entry.append(p)
-
-    # 3) Import centrality scoring (generic + powerful)
-    inbound, outbound = _collect_import_centrality(root)
-    central: list[tuple[int, Path]] = []
-    for rel, score in inbound.most_common(80):
-        fp = root / rel
-        if fp.exists() and fp.is_file():
-            central.append((score, fp))
 
-    # 4) Heuristic scoring fallback (your original logic, lightly improved)
-    candidates: list[tuple[int, Path]] = []
-    for p in iter_repo_files(root):
-        rel = p.relative_to(root)
-        rel_str = str(rel).lower()
-        name = p.name
+@functools.lru_cache(maxsize=16)
+def _pick_important_files_cached(root_str: str, max_files: int, fingerprint: int) -> tuple[Path, ...]:
+    # fingerprint is only part of the cache key
+    return tuple(_pick_important_files(Path(root_str), max_files))
+
+
+def _pick_important_files(root: Path, max_files: int) -> list[Path]:
+    # single walk, then one classification pass over it; only the import scan reads files
+    files = _scan_repo(root)
+
+    by_rel: dict[str, FileInfo] = {}
+    pinned: list[FileInfo] = []
+    entry: list[FileInfo] = []
+    import_sources: list[tuple[int, FileInfo]] = []
+    # heuristic score minus the "wiring" bonus, which needs the import scan first
+    base_scored: list[tuple[int, FileInfo]] = []
+    route_hint = ROUTE_HINT_RE.search
+    config_hint = CONFIG_HINT_RE.search
+
+    for i, fi in enumerate(files):
+        by_rel[fi.relposix] = fi
+        name = fi.name
+        lowname = fi.lower_name
+
+        # 1) Always include priority files near root (depth <= 1)
+        if name in PRIORITY_FILES and fi.relposix.count("/") <= 1:
+            pinned.append(fi)
+
+        # 2) Likely entry files (anywhere)
+        if lowname in ENTRY_FILENAMES:
+            entry.append(fi)
+
+        # 3) Sources for the import-centrality scan below
+        if _is_import_source(fi):
+            import_sources.append((i, fi))
+
+        # 4) Heuristic scoring fallback (your original logic, lightly improved)
+        size = fi.size
+
+        # skip huge files
+        if size > 350_000:
+            continue
+
+        rel_str = fi.lower_relstr
 
         score = 0
         if name in PRIORITY_FILES:
             score += 120
 
-        parts = set(rel.parts)
-        if parts & CODE_DIR_HINTS:
+        # isdisjoint checks the parts tuple in C without building a set per file
+        parts = fi.parts
+        if not CODE_DIR_HINTS.isdisjoint(parts):
             score += 40
-        if parts & DEPRIORITIZE_DIRS:
+        if not DEPRIORITIZE_DIRS.isdisjoint(parts):
             score -= 35
 
-        lowname = name.lower()
         if lowname in ENTRY_FILENAMES:
             score += 90
 
-        if lowname.endswith(("routes.py", "router.py", "handlers.go", "controller.ts", "controller.js", "urls.py")):
+        if lowname.endswith(ROUTE_FILE_SUFFIXES):
             score += 45
-        if any(x in rel_str for x in ["route", "router", "controller", "handler", "endpoint", "service"]):
+        if route_hint(rel_str):
             score += 20
-        if any(x in rel_str for x in ["config", "settings", "infra", "deploy", ".github"]):
+        if config_hint(rel_str):
             score += 15
 
-        try:
-            size = p.stat().st_size
-        except OSError:
-            continue
+        # prefer smaller files a bit
+        score -= size // 12_000
 
-        # skip huge files
-        if size > 350_000:
-            continue
+        base_scored.append((score, fi))
 
-        # prefer smaller files a bit
-        score -= int(size / 12_000)
+    # ensure README first if present
+    for rn in ["README.md", "README.rst", "README.txt"]:
+        rfi = by_rel.get(rn)
+        if rfi is not None and rfi not in pinned:
+            pinned.insert(0, rfi)
+
+    # Import centrality scoring (generic + powerful)
+    inbound, outbound = _collect_import_centrality(root, files, sources=import_sources)
+    central: list[tuple[int, FileInfo]] = []
+    for rel, score in inbound.most_common(80):
+        fi = by_rel.get(rel)
+        if fi is not None:
+            central.append((score, fi))
 
+    candidates: list[tuple[int, FileInfo]] = []
+    for score, fi in base_scored:
         # boost files that are "wiring" (import many)
-        relposix = p.relative_to(root).as_posix()
-        if outbound.get(relposix, 0) >= 8:
+        if outbound.get(fi.relposix, 0) >= 8:
             score += 25
 
         if score > 0:
-            candidates.append((score, p))
+            candidates.append((score, fi))
 
-    candidates.sort(key=lambda x: x[0], reverse=True)
+    # only the top few can make the cut; 2x leaves room for ones already picked above
+    candidates = heapq.nlargest(max_files * 2, candidates, key=lambda x: x[0])
 
     # Merge everything with de-dupe, preserve order of importance
-    def add_unique(out: list[Path], items: list[Path]):
-        seen = {x.resolve() for x in out}
+    # every item comes from the same scan, so relposix is already canonical (no resolve())
+    seen: set[str] = set()
+
+    def add_unique(out: list[FileInfo], items: list[FileInfo]):
         for it in items:
-            try:
-                rp = it.resolve()
-            except Exception:
-                rp = it
-            if rp not in seen:
+            if it.relposix not in seen:
                 out.append(it)
-                seen.add(rp)
+                seen.add(it.relposix)
 
-    picked: list[Path] = []
+    picked: list[FileInfo] = []
     add_unique(picked, pinned)
     add_unique(picked, entry)
 
@@ -285,32 +456,158 @@ def pick_important_files(root: Path, max_files: int = 40) -> list[Path]:
     # add heuristic candidates
     add_unique(picked, [p for _, p in candidates])
 
-    return picked[:max_files]
+    return [Path(fi.path) for fi in picked[:max_files]]
+
+
+_BLANK_RUN_RE = re.compile(r"\n{3,}")
+# Line breaks as ast counts them; str.splitlines() also breaks on \f, \v, \x1c-\x1e,
+# \x85, \u2028 and \u2029, which would shift docstring line numbers.
+_LINE_BREAK_RE = re.compile(r"\r\n|\r|\n")
 
+# Snippet compaction knobs (fewer prompt tokens, same signal)
+SNIPPET_HEAD_TAIL_MIN_CHARS = 20_000
+SNIPPET_HEAD_LINES = 200
+SNIPPET_TAIL_LINES = 50
+MAX_DOCSTRING_LINES = 30
+# Files bigger than this are read as a bounded head + tail instead of whole
+SNIPPET_FULL_READ_MAX_BYTES = 256_000
+SNIPPET_HEAD_BYTES = 64_000
+SNIPPET_TAIL_BYTES = 16_000
 
-def read_files(root: Path, files: list[Path], max_total_chars: int = 180_000) -> str:
+
+def _trim_long_docstrings(lines: list[str], text: str) -> list[str]:
     """
-    Reads files and returns a stitched context string with per-file caps and total cap.
+    Replace Python docstrings longer than MAX_DOCSTRING_LINES with their first and last line.
+    """
+    # repo source is untrusted: deep nesting can blow the parser's stack or memory, and
+    # invalid escapes would print SyntaxWarnings for the analysed file into server logs
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            tree = ast.parse(text)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        return lines
+
+    spans: list[tuple[int, int]] = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        body = node.body
+        if not body or not isinstance(body[0], ast.Expr):
+            continue
+        doc = body[0].value
+        if isinstance(doc, ast.Constant) and isinstance(doc.value, str):
+            start, end = doc.lineno, doc.end_lineno or doc.lineno
+            if end - start + 1 > MAX_DOCSTRING_LINES:
+                spans.append((start, end))
+
+    # replace bottom-up so earlier line numbers stay valid
+    for start, end in sorted(spans, reverse=True):
+        first, last = lines[start - 1], lines[end - 1]
+        indent = first[: len(first) - len(first.lstrip())]
+        lines[start - 1 : end] = [first, f"{indent}... ({end - start - 1} docstring lines trimmed)", last]
+    return lines
+
+
+def _compact_snippet(p: Path, text: str, head_tail: bool = True) -> str:
+    """
+    Shrink a file body before it goes into the prompt:
+    drop long docstrings (Python), trailing whitespace, blank-line runs,
+    and keep only head + tail of very large files (head_tail=False when the text
+    already is a head + tail excerpt from _read_head_tail).
+    """
+    lines = _LINE_BREAK_RE.split(text)
+    if lines and not lines[-1]:
+        lines.pop()  # trailing newline, same as splitlines()
+    if p.suffix.lower() == ".py" and ('"""' in text or "'''" in text):
+        lines = _trim_long_docstrings(lines, text)
+
+    if head_tail and len(text) > SNIPPET_HEAD_TAIL_MIN_CHARS and len(lines) > SNIPPET_HEAD_LINES + SNIPPET_TAIL_LINES:
+        omitted = len(lines) - SNIPPET_HEAD_LINES - SNIPPET_TAIL_LINES
+        lines = (
+            lines[:SNIPPET_HEAD_LINES]
+            + [f"... ({omitted} lines omitted) ..."]
+            + lines[-SNIPPET_TAIL_LINES:]
+        )
+
+    out = "\n".join(line.rstrip() for line in lines)
+    return _BLANK_RUN_RE.sub("\n\n", out)
+
+
+def _read_head_tail(p: Path) -> str | None:
+    """
+    For big files (lockfiles, generated code) read only the head and tail bytes,
+    which is all the head/tail compaction would keep. None means "small, read it whole".
+    """
+    with p.open("rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size <= SNIPPET_FULL_READ_MAX_BYTES:
+            return None
+        f.seek(0)
+        head = f.read(SNIPPET_HEAD_BYTES).decode("utf-8", "ignore").splitlines()[:SNIPPET_HEAD_LINES]
+        f.seek(size - SNIPPET_TAIL_BYTES)
+        # first tail line is almost always cut mid-way
+        tail = f.read().decode("utf-8", "ignore").splitlines()[1:][-SNIPPET_TAIL_LINES:]
+    return "\n".join(head + [f"... (middle of {size:,}-byte file omitted) ..."] + tail)
+
+
+def _read_text_cached(p: Path, cache: dict[Path, bytes] | None = None) -> tuple[str, bool] | None:
+    """
+    Returns (text, is_excerpt); is_excerpt means the text is already head + tail.
+    """
+    try:
+        text = _read_head_tail(p)
+        if text is not None:
+            return text, True
+        # bytes + decode skips text-mode newline translation
+        return read_bytes_cached(p, cache).decode("utf-8", "ignore"), False
+    except Exception:
+        return None
+
+
+def read_file_chunks(
+    root: Path,
+    files: list[Path],
+    max_total_chars: int = 180_000,
+    read_cache: dict[Path, bytes] | None = None,
+):
+    """
+    Yield one "===== FILE: ... =====" block per file under per-file and total caps,
+    ending with a truncation note if the budget runs out.
     """
-    chunks = []
     total = 0
 
-    for p in files:
+    # read concurrently, then yield in order so the total cap cuts at the same file
+    texts: list[tuple[str, bool] | None] = []
+    if files:
+        with ThreadPoolExecutor(max_workers=min(_READ_WORKERS, len(files))) as ex:
+            texts = list(ex.map(functools.partial(_read_text_cached, cache=read_cache), files))
+
+    for p, read in zip(files, texts):
         rel = p.relative_to(root)
-        try:
-            text = p.read_text(errors="ignore")
-        except Exception:
+        if read is None:
             continue
+        text, is_excerpt = read
 
         # per-file cap
-        snippet = text[:28_000]
+        snippet = _compact_snippet(p, text, head_tail=not is_excerpt)[:28_000]
 
         block = f"\n\n===== FILE: {rel} =====\n{snippet}"
         if total + len(block) > max_total_chars:
-            chunks.append("\n\n... (content truncated to fit context budget)")
-            break
+            yield "\n\n... (content truncated to fit context budget)"
+            return
 
-        chunks.append(block)
+        yield block
         total += len(block)
 
-    return "".join(chunks)
\ No newline at end of file
+
+def read_files(
+    root: Path,
+    files: list[Path],
+    max_total_chars: int = 180_000,
+    read_cache: dict[Path, bytes] | None = None,
+) -> str:
+    """
+    Reads files and returns a stitched context string with per-file caps and total cap.
+    """
+    return "".join(read_file_chunks(root, files, max_total_chars, read_cache))
\ No newline at end of file